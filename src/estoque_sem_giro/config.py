@@ -1,10 +1,21 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import cache
 from pathlib import Path
-from zoneinfo import ZoneInfo
+from typing import TYPE_CHECKING
 from datetime import datetime, timedelta
 
+if TYPE_CHECKING:
+    from zoneinfo import ZoneInfo
+
+
+@cache
+def _timezone() -> "ZoneInfo":
+    # import adiado + cache: carregar o banco de zoneinfo custa dezenas de ms
+    from zoneinfo import ZoneInfo
+    return ZoneInfo("America/Recife")
+
 @dataclass(frozen=True)
 class Config:
     project_root: Path
@@ -12,7 +23,7 @@ class Config:
     input_dir: Path
     output_dir: Path
     archive_dir: Path
-    timezone: ZoneInfo
+    timezone: "ZoneInfo"
     expected_sheets: tuple[str, ...]
     final_fields: tuple[str, ...]
     output_basename: str
@@ -23,9 +34,12 @@ class Config:
     report_folder_prefix: str
     report_sheet_main: str
     report_sheet_disc: str
-    # para descontinuados 
+    # para descontinuados
     discontinued_folder_prefix: str
-    discontinued_fields: tuple[str, ...]   
+    discontinued_fields: tuple[str, ...]
+    # teto de linhas varridas por aba: arquivos corrompidos podem declarar a
+    # dimensão máxima do Excel (1.048.576 linhas) e travar a extração
+    max_rows_hard_limit: int = 1_048_576
 
 def load_config() -> Config:
     # projeto com layout "src/"; o root é 2 níveis acima deste arquivo
@@ -37,7 +51,7 @@ def load_config() -> Config:
         input_dir=data_dir / "input",
         output_dir=data_dir / "output",
         archive_dir=data_dir / "archived",
-        timezone=ZoneInfo("America/Recife"),
+        timezone=_timezone(),
         expected_sheets=("EUD", "BOT", "QDB"),
         final_fields=("PDV", "SKU", "DESCRIÇÃO", "MARCA", "CURVA", "ESTOQUE_ATUAL"),
         output_basename="Estoque_sem_giro",
@@ -50,10 +64,13 @@ def load_config() -> Config:
         report_sheet_disc="Descontinuados",
         # para descontinuados
         discontinued_folder_prefix="descontinuados",
-        discontinued_fields=("PDV", "SKU","SKU_PARA" ,"DESCRIÇÃO", "ESTOQUE ATUAL","FASES DO PRODUTO","MARCA"),   
+        discontinued_fields=("PDV", "SKU","SKU_PARA" ,"DESCRIÇÃO", "ESTOQUE ATUAL","FASES DO PRODUTO","MARCA"),
+        max_rows_hard_limit=1_048_576,
     )
 
 def ensure_dirs(cfg: Config) -> None:
+    # as pastas datadas ficam a cargo de cada writer: só nascem quando a
+    # rodada realmente produz aquele tipo de saída
     cfg.input_dir.mkdir(parents=True, exist_ok=True)
     cfg.output_dir.mkdir(parents=True, exist_ok=True)
     cfg.archive_dir.mkdir(parents=True, exist_ok=True)
@@ -1,34 +1,188 @@
 from __future__ import annotations
 
 from pathlib import Path
-from openpyxl import load_workbook
-from openpyxl.utils.cell import column_index_from_string
-from typing import Iterable
+from zipfile import ZipFile
+from xml.etree.ElementTree import iterparse
+from typing import Iterable, Iterator
+
+# namespaces do SpreadsheetML (xlsx)
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL  = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
 
 _HEADER_TOKENS = {
     "sku", "descrição", "descricao", "curva", "classe",
     "pdv", "estoque", "estoque atual", "estoque_atual"
 }
 
+_NAN_STRS = {"nan", "NaN", "NAN", "none", "None", "NONE"}
+
 def _clean_str(v) -> str:
+    # chamado por célula: despacho por tipo evita str()/lower() no caminho comum
     if v is None:
         return ""
+    t = type(v)
+    if t is str:
+        s = v.strip()
+        if s in _NAN_STRS:
+            return ""
+        return s[:-2] if s.endswith(".0") else s
+    if t is int:
+        return str(v)
+    if t is float:
+        if v != v:  # NaN
+            return ""
+        return str(int(v)) if v.is_integer() else repr(v)
     s = str(v).strip()
     if s.lower() in ("nan", "none"):
         return ""
-    if s.endswith(".0"):
-        s = s[:-2]
-    return s
+    return s[:-2] if s.endswith(".0") else s
 
-def looks_like_header(values: list[str]) -> bool:
-    hits = sum(1 for v in values if v.lower().strip() in _HEADER_TOKENS)
-    return hits >= 2
+def looks_like_header(values: Iterable[str]) -> bool:
+    # roda no laço mais quente da busca de cabeçalho: corta assim que fecha 2
+    hits = 0
+    for v in values:
+        if v.strip().lower() in _HEADER_TOKENS:
+            hits += 1
+            if hits >= 2:
+                return True
+    return False
 
 def open_workbook(path: Path, data_only: bool = True):
+    # import adiado: o caminho quente de extração não usa mais o openpyxl
+    from openpyxl import load_workbook
     return load_workbook(filename=str(path), read_only=True, data_only=data_only)
 
+
+# ---------- Leitura streaming (SAX) do xlsx ----------
+# openpyxl em read_only ainda cria um ReadOnlyCell por célula; para a varredura
+# pura de linhas que fazemos aqui, ler o XML direto com iterparse evita esses
+# objetos intermediários e reduz muito o custo de memória/CPU.
+
+def _col_to_index(ref: str) -> int:
+    """Converte a parte alfabética de uma referência ('J5' -> 10)."""
+    idx = 0
+    for ch in ref:
+        if ch.isdigit():
+            break
+        idx = idx * 26 + (ord(ch) - 64)
+    return idx
+
+
+def _load_shared_strings(zf: ZipFile) -> list[str]:
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return []
+    strings: list[str] = []
+    parts: list[str] = []
+    with zf.open("xl/sharedStrings.xml") as src:
+        for _, el in iterparse(src, events=("end",)):
+            if el.tag == _NS_MAIN + "t":
+                parts.append(el.text or "")
+            elif el.tag == _NS_MAIN + "si":
+                strings.append("".join(parts))
+                parts.clear()
+                el.clear()
+    return strings
+
+
+def _sheet_targets(zf: ZipFile) -> dict[str, str]:
+    """Mapeia nome da aba -> caminho do XML dentro do zip (via rels)."""
+    rels: dict[str, str] = {}
+    with zf.open("xl/_rels/workbook.xml.rels") as src:
+        for _, el in iterparse(src, events=("end",)):
+            if el.tag.endswith("}Relationship"):
+                rels[el.get("Id", "")] = el.get("Target", "")
+    targets: dict[str, str] = {}
+    with zf.open("xl/workbook.xml") as src:
+        for _, el in iterparse(src, events=("end",)):
+            if el.tag == _NS_MAIN + "sheet":
+                target = rels.get(el.get(_NS_REL + "id", ""), "")
+                if not target:
+                    continue
+                if target.startswith("/"):
+                    target = target.lstrip("/")
+                elif not target.startswith("xl/"):
+                    target = "xl/" + target
+                targets[el.get("name", "")] = target
+    return targets
+
+
+def _iter_sheet_rows(
+    zf: ZipFile,
+    target: str,
+    sst: list[str],
+    max_col: int,
+    include_formulas: bool = False,
+) -> Iterator[tuple[str, ...]]:
+    """Emite cada linha como tupla de strings (colunas 1..max_col)."""
+    row_vals = [""] * max_col
+    col = 0
+    with zf.open(target) as src:
+        for _, el in iterparse(src, events=("end",)):
+            tag = el.tag
+            if tag == _NS_MAIN + "c":
+                ref = el.get("r")
+                col = _col_to_index(ref) if ref else col + 1
+                if col <= max_col:
+                    t = el.get("t")
+                    if t == "s":
+                        v = el.findtext(_NS_MAIN + "v")
+                        val = sst[int(v)] if v else ""
+                    elif t == "inlineStr":
+                        val = "".join(
+                            node.text or "" for node in el.iter(_NS_MAIN + "t")
+                        )
+                    else:
+                        val = el.findtext(_NS_MAIN + "v") or ""
+                        if t == "b" and val:
+                            val = "True" if val != "0" else "False"
+                        elif not val and include_formulas:
+                            f = el.findtext(_NS_MAIN + "f")
+                            if f:
+                                val = "=" + f
+                    row_vals[col - 1] = val
+                el.clear()
+            elif tag == _NS_MAIN + "row":
+                yield tuple(row_vals)
+                row_vals = [""] * max_col
+                col = 0
+                el.clear()
+
+
+class StreamingWorkbook:
+    """Leitor somente-valores de um .xlsx via zipfile + iterparse.
+
+    Equivalente a data_only=True do openpyxl (lê o valor cacheado das
+    fórmulas); com include_formulas=True devolve o texto da fórmula quando
+    não há valor cacheado.
+    """
+
+    def __init__(self, path: Path):
+        self._zf = ZipFile(str(path))
+        self._targets = _sheet_targets(self._zf)
+        self._sst: list[str] | None = None
+
+    @property
+    def sheetnames(self) -> list[str]:
+        return list(self._targets)
+
+    def iter_rows(
+        self, sheet_name: str, max_col: int, include_formulas: bool = False
+    ) -> Iterator[tuple[str, ...]]:
+        if self._sst is None:
+            self._sst = _load_shared_strings(self._zf)
+        yield from _iter_sheet_rows(
+            self._zf, self._targets[sheet_name], self._sst, max_col, include_formulas
+        )
+
+    def close(self) -> None:
+        self._zf.close()
+
+
+def open_stream(path: Path) -> StreamingWorkbook:
+    return StreamingWorkbook(path)
+
 def find_header_row(ws, cols: Iterable[str], search_limit: int = 200) -> int | None:
-    idxs = [column_index_from_string(c) for c in cols]   # A=1, C=3, E=5, I=9, J=10
+    idxs = [_col_to_index(c) for c in cols]   # A=1, C=3, E=5, I=9, J=10
     max_col = max(idxs)
     max_row_scan = min(ws.max_row or 1, search_limit)
 
@@ -44,12 +198,12 @@ def find_header_row(ws, cols: Iterable[str], search_limit: int = 200) -> int | N
             return r_idx
     return None
 
-def preview_sheet(ws, cols: Iterable[str], max_rows: int) -> list[list[str]]:
+def preview_sheet(swb: "StreamingWorkbook", sheet_name: str, cols: Iterable[str], max_rows: int) -> list[list[str]]:
     """Retorna até max_rows de amostras como lista de linhas de strings."""
-    idxs = [column_index_from_string(c) for c in cols]
+    idxs = [_col_to_index(c) for c in cols]
     max_col = max(idxs)
     samples: list[list[str]] = []
-    for row in ws.iter_rows(min_row=1, min_col=1, max_col=max_col, values_only=True):
+    for row in swb.iter_rows(sheet_name, max_col):
         vals = []
         has_any = False
         for i in idxs:
@@ -1,24 +1,73 @@
 from __future__ import annotations
 from typing import Iterable
-from .excel_reader import _clean_str, find_header_row
+from .excel_reader import StreamingWorkbook, _clean_str, looks_like_header
 
-_COL_POS = {"A": 1, "C": 3, "E": 5, "I": 9, "J": 10}  # 1-based
+_COL_POS = {"A": 1, "B": 2, "C": 3, "E": 5, "F": 6, "I": 9, "J": 10}  # 1-based
+_MAX_COL = max(_COL_POS.values())
+_HEADER_SEARCH_LIMIT = 200
+# xlsx com dimensão "fantasma" declara linhas até o limite do Excel; depois
+# dessa sequência de linhas totalmente vazias assumimos fim de dados
+_EMPTY_ROW_BREAK = 200
 
-def extract_sheet(ws, marca: str) -> list[dict]:
-    header_row = find_header_row(ws, cols=("A","C","E","I","J"))
-    start_row  = (header_row + 1) if header_row else 1
-    max_col    = max(_COL_POS.values())
+def extract_both_sheet(swb: StreamingWorkbook, sheet_name: str, marca: str,
+                       include_formulas: bool = False,
+                       preview: list[list[str]] | None = None,
+                       preview_max_rows: int = 3,
+                       max_rows: int | None = None) -> tuple[list[dict], list[dict]]:
+    """
+    Varre a aba UMA única vez e produz as duas listas:
+      - registros normais (A,C,E,I,J): PDV, SKU, DESCRIÇÃO, MARCA, CURVA, ESTOQUE_ATUAL
+      - descontinuados (A,B,C,F,I,J), apenas linhas cuja F (FASES DO PRODUTO)
+        contenha 'descontinuado' (case-insensitive):
+        PDV, SKU, SKU_PARA, DESCRIÇÃO, ESTOQUE ATUAL, FASES DO PRODUTO, MARCA
+
+    Se `preview` for passada, recebe as primeiras linhas não vazias (até
+    preview_max_rows) como efeito colateral da mesma varredura.
+
+    `max_rows` (se dado) limita quantas linhas são varridas; junto com o
+    corte por sequência de linhas vazias, protege contra planilhas com
+    dimensão "fantasma" de 1.048.576 linhas.
+    """
+    records: list[dict] = []
+    discontinued: list[dict] = []
+    # o cabeçalho é detectado dentro do mesmo laço: iter_rows em streaming não
+    # tem seek, então uma pré-varredura separada reiniciaria o parse do XML
+    searching_header = True
+    empty_streak = 0
+    rows = swb.iter_rows(sheet_name, _MAX_COL, include_formulas=include_formulas)
+    for r_idx, row in enumerate(rows, start=1):
+        if max_rows is not None and r_idx > max_rows:
+            break
+        if not any(row):
+            empty_streak += 1
+            if empty_streak >= _EMPTY_ROW_BREAK and not searching_header:
+                break
+            continue
+        empty_streak = 0
 
-    out: list[dict] = []
-    for row in ws.iter_rows(min_row=start_row, min_col=1, max_col=max_col, values_only=True):
         def at(i: int) -> str:
             return _clean_str(row[i-1] if len(row) >= i else "")
+
         sku, desc, curva, pdv, est = at(1), at(3), at(5), at(9), at(10)
-        if not any((sku, desc, curva, pdv, est)):
-            continue
+        if preview is not None and len(preview) < preview_max_rows:
+            if any((sku, desc, curva, pdv, est)):
+                preview.append([sku, desc, curva, pdv, est])
+        if searching_header:
+            if looks_like_header([sku, desc, curva, pdv, est]):
+                # achou o cabeçalho: linhas anteriores eram lixo de topo
+                searching_header = False
+                records.clear()
+                discontinued.clear()
+                continue
+            if r_idx >= _HEADER_SEARCH_LIMIT:
+                # sem cabeçalho nas primeiras linhas: trata tudo como dados
+                searching_header = False
+
+        # requisitos mínimos (valem para as duas saídas)
         if not sku or not pdv:
             continue
-        out.append({
+
+        records.append({
             "PDV":           pdv,
             "SKU":           sku,
             "DESCRIÇÃO":     desc,
@@ -26,71 +75,34 @@ def extract_sheet(ws, marca: str) -> list[dict]:
             "CURVA":         curva,
             "ESTOQUE_ATUAL": est,
         })
-    return out
-
-def extract_all(wb, expected_sheets: Iterable[str]) -> list[dict]:
-    data: list[dict] = []
-    for sheet in expected_sheets:
-        if sheet in wb.sheetnames:
-            ws = wb[sheet]
-            recs = extract_sheet(ws, marca=sheet)
-            data.extend(recs)
-    return data
-
-
-def extract_discontinued_sheet(ws, marca: str) -> list[dict]:
-    """
-    Lê as colunas A,B,C,F,I,J e retorna APENAS linhas cuja F (FASES DO PRODUTO)
-    contenha 'descontinuado' (case-insensitive).
-    Campos de saída (ordem/nomes exatos):
-      PDV, SKU, SKU_PARA, DESCRIÇÃO, ESTOQUE ATUAL, FASES DO PRODUTO, MARCA
-    """
-    from .excel_reader import _clean_str, find_header_row
-    col_pos = {"A": 1, "B": 2, "C": 3, "F": 6, "I": 9, "J": 10}
-
-    header_row = find_header_row(ws, cols=("A", "C", "E", "I", "J"))
-    start_row  = (header_row + 1) if header_row else 1
-    max_col    = max(col_pos.values())
-
-    out: list[dict] = []
-    for row in ws.iter_rows(min_row=start_row, min_col=1, max_col=max_col, values_only=True):
-        def at(i: int) -> str:
-            return _clean_str(row[i-1] if len(row) >= i else "")
-
-        sku   = at(col_pos["A"])
-        sku_p = at(col_pos["B"])  # SKU_PARA
-        desc  = at(col_pos["C"])
-        fase  = at(col_pos["F"])
-        pdv   = at(col_pos["I"])
-        est   = at(col_pos["J"])
 
-        # requisitos mínimos
-        if not sku or not pdv:
-            continue
-
-        # filtra por 'descontinuado' (tolerante a maiúsculas/minúsculas/acentos simples)
-        fase_norm = (fase or "").strip().lower()
-        if "descontinuado" not in fase_norm:
-            continue
-
-        out.append({
-            "PDV":               pdv,
-            "SKU":               sku,
-            "SKU_PARA":          sku_p,
-            "DESCRIÇÃO":         desc,
-            "ESTOQUE ATUAL":     est,
-            "FASES DO PRODUTO":  fase,
-            "MARCA":             marca,
-        })
+        # filtra por 'descontinuado' (tolerante a maiúsculas/minúsculas/acentos
+        # simples); testa o texto BRUTO de F antes de limpar qualquer campo
+        # extra — na maioria das linhas o teste falha e F/B nem são limpas
+        raw_fase = row[5] if len(row) >= 6 else ""
+        if raw_fase and "descontinuado" in raw_fase.lower():
+            fase = at(6)
+            discontinued.append({
+                "PDV":               pdv,
+                "SKU":               sku,
+                "SKU_PARA":          at(2),
+                "DESCRIÇÃO":         desc,
+                "ESTOQUE ATUAL":     est,
+                "FASES DO PRODUTO":  fase,
+                "MARCA":             marca,
+            })
 
-    return out
+    return records, discontinued
 
 
-def extract_discontinued_all(wb, expected_sheets: Iterable[str]) -> list[dict]:
-    data: list[dict] = []
+def extract_both(swb: StreamingWorkbook, expected_sheets: Iterable[str],
+                 include_formulas: bool = False) -> tuple[list[dict], list[dict]]:
+    records: list[dict] = []
+    discontinued: list[dict] = []
     for sheet in expected_sheets:
-        if sheet in wb.sheetnames:
-            ws = wb[sheet]
-            recs = extract_discontinued_sheet(ws, marca=sheet)
-            data.extend(recs)
-    return data
+        if sheet in swb.sheetnames:
+            recs, disc = extract_both_sheet(swb, sheet, marca=sheet,
+                                            include_formulas=include_formulas)
+            records.extend(recs)
+            discontinued.extend(disc)
+    return records, discontinued
@@ -2,12 +2,14 @@ from __future__ import annotations
 
 from pathlib import Path
 import logging
+import os
 # Adicionado 'yesterday_str' para a nova linha de log
 from .config import Config, ensure_dirs, yesterday_str
 from .logging_config import setup_logging
-from .excel_reader import open_workbook, preview_sheet
-from .extractor import extract_all, extract_discontinued_all
+from .excel_reader import open_stream
+from .extractor import extract_both_sheet
 from .writers import (
+    group_records_by_pdv,
     write_consolidated_csv,
     write_csvs_by_pdv,
     write_reports_xlsx_by_pdv,
@@ -20,21 +22,45 @@ def is_excel(p: Path) -> bool:
     return p.is_file() and p.suffix.lower() == ".xlsx" and not p.name.startswith("~$")
 
 
+def _is_excel_entry(e: os.DirEntry) -> bool:
+    return (
+        e.name.lower().endswith(".xlsx")
+        and not e.name.startswith("~$")
+        and e.is_file()
+    )
+
+
 def list_excels(input_dir: Path) -> list[Path]:
+    # os.scandir devolve DirEntry com stat cacheado (1 ida ao disco por item)
     if not input_dir.exists():
         return []
-    xs = [p for p in input_dir.iterdir() if is_excel(p)]
-    xs.sort(key=lambda x: (x.stat().st_mtime, x.name))
-    return xs
+    with os.scandir(input_dir) as it:
+        entries = [e for e in it if _is_excel_entry(e)]
+    entries.sort(key=lambda e: (e.stat().st_mtime, e.name))
+    return [Path(e.path) for e in entries]
 
 
 def latest_excel(input_dir: Path) -> Path | None:
-    xs = list_excels(input_dir)
-    return xs[-1] if xs else None
+    # só o mais recente: uma passada, sem ordenar nem montar lista
+    if not input_dir.exists():
+        return None
+    newest: os.DirEntry | None = None
+    newest_key: tuple[float, str] | None = None
+    with os.scandir(input_dir) as it:
+        for e in it:
+            if not _is_excel_entry(e):
+                continue
+            key = (e.stat().st_mtime, e.name)
+            if newest_key is None or key > newest_key:
+                newest, newest_key = e, key
+    return Path(newest.path) if newest else None
 
 
 def process_latest(cfg: Config) -> bool:
     setup_logging()
+    # calculada uma única vez: pastas e writers usam a mesma data mesmo que a
+    # execução atravesse a meia-noite
+    date_str = yesterday_str(cfg)
     ensure_dirs(cfg)
 
     xlsx = latest_excel(cfg.input_dir)
@@ -44,74 +70,88 @@ def process_latest(cfg: Config) -> bool:
 
     logging.info("Arquivo selecionado (mais recente): %s", xlsx.name)
 
-    # 1) data_only=True
+    # 1) leitura streaming (equivale a data_only=True)
     try:
-        wb = open_workbook(xlsx, data_only=True)
+        swb = open_stream(xlsx)
     except Exception as e:
         logging.exception("Falha ao abrir workbook: %s", e)
         return False
 
-    # prévias (opcional)
+    records: list[dict] = []
+    discontinued: list[dict] = []
+    empty_sheets: list[str] = []
     for sheet in cfg.expected_sheets:
-        if sheet in wb.sheetnames:
-            try:
-                samples = preview_sheet(
-                    wb[sheet], cols=("A", "C", "E", "I", "J"), max_rows=cfg.preview_max_rows
+        if sheet not in swb.sheetnames:
+            continue
+        # prévia sai da mesma varredura da extração (sem passada extra)
+        samples: list[list[str]] = []
+        recs, disc = extract_both_sheet(
+            swb, sheet, marca=sheet,
+            preview=samples, preview_max_rows=cfg.preview_max_rows,
+            max_rows=cfg.max_rows_hard_limit,
+        )
+        if samples:
+            header = " | ".join(("A", "C", "E", "I", "J"))
+            logging.info("Prévia %s: %s", sheet, header)
+            for row in samples:
+                logging.info(" | ".join(row))
+        if not recs:
+            empty_sheets.append(sheet)
+        records.extend(recs)
+        discontinued.extend(disc)
+
+    # 2) fallback sem cache de fórmulas: relê SOMENTE as abas que vieram vazias,
+    # devolvendo o texto da fórmula no lugar do valor cacheado inexistente
+    if empty_sheets and cfg.enable_fallback:
+        logging.warning(
+            "Abas sem registros (%s); tentando fallback com texto das fórmulas.",
+            ", ".join(empty_sheets),
+        )
+        try:
+            for sheet in empty_sheets:
+                recs, disc = extract_both_sheet(
+                    swb, sheet, marca=sheet, include_formulas=True,
+                    max_rows=cfg.max_rows_hard_limit,
                 )
-                if samples:
-                    header = " | ".join(("A", "C", "E", "I", "J"))
-                    logging.info("Prévia %s: %s", sheet, header)
-                    for row in samples:
-                        logging.info(" | ".join(row))
-            except Exception:
-                pass
-
-    records = extract_all(wb, cfg.expected_sheets)
-    # extrai descontinuados no mesmo workbook (BLOCO 1 - já estava no seu código)
-    discontinued = extract_discontinued_all(wb, cfg.expected_sheets)
+                records.extend(recs)
+                discontinued.extend(disc)
+        except Exception as e:
+            logging.exception("Falha no fallback: %s", e)
+
     try:
-        wb.close()
+        swb.close()
     except Exception:
         pass
 
-    # 2) fallback sem cache de fórmulas
-    if not records and cfg.enable_fallback:
-        logging.warning("Sem registros; tentando fallback data_only=False.")
-        try:
-            wb2 = open_workbook(xlsx, data_only=False)
-            records = extract_all(wb2, cfg.expected_sheets)
-            # NOVO: extrai descontinuados no fallback (BLOCO 2)
-            discontinued = extract_discontinued_all(wb2, cfg.expected_sheets)
-            try:
-                wb2.close()
-            except Exception:
-                pass
-        except Exception as e:
-            logging.exception("Falha no fallback: %s", e)
-
     if not records:
         logging.error(
             "Ainda sem registros. Reabra no Excel, Ctrl+Alt+F9 (recalcular) e salve."
         )
         return False
 
-    out = write_consolidated_csv(records, cfg)
+    # agrupa/ordena por PDV UMA vez; consolidado, CSVs e relatórios consomem
+    # o mesmo dict (cada grupo já sai ordenado por SKU)
+    groups = group_records_by_pdv(records)
+
+    out = write_consolidated_csv(groups, cfg, date_str)
     logging.info("[OK] Consolidado: %s", out)
 
     if cfg.generate_by_pdv:
-        paths = write_csvs_by_pdv(records, cfg)
+        paths = write_csvs_by_pdv(groups, cfg, date_str)
         logging.info("[OK] %d CSVs por PDV gerados.", len(paths))
 
-    reports = write_reports_xlsx_by_pdv(records, cfg)
+    reports = write_reports_xlsx_by_pdv(groups, cfg, date_str)
     logging.info("[OK] %d relatórios Excel por PDV gerados.", len(reports))
 
     # NOVO: CSVs de DESCONTINUADOS por PDV (BLOCO 3)
     if discontinued:
-        disc_paths = write_discontinued_csvs_by_pdv(discontinued, cfg)
+        disc_paths = write_discontinued_csvs_by_pdv(
+            group_records_by_pdv(discontinued), cfg, date_str
+        )
         logging.info(
             "[OK] %d CSVs de descontinuados por PDV gerados em %s",
             len(disc_paths),
-            (cfg.output_dir / f"{cfg.discontinued_folder_prefix}_{yesterday_str(cfg)}"),
+            (cfg.output_dir / f"{cfg.discontinued_folder_prefix}_{date_str}"),
         )
     else:
         logging.info("Nenhum registro de descontinuados encontrado nas abas esperadas.")
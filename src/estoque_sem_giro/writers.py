@@ -1,53 +1,130 @@
 from __future__ import annotations
 
 from pathlib import Path
-import csv
+import functools
+import io
 import re, os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from operator import itemgetter
 from .config import Config, yesterday_str
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
-from openpyxl.utils import get_column_letter
 
-def write_consolidated_csv(records: list[dict], cfg: Config) -> Path:
-    if not records:
+# os backends de .xlsx (openpyxl/xlsxwriter) são importados dentro das funções
+# de relatório: o caminho só-CSV não deve pagar esse custo de import
+
+
+@functools.cache
+def _xlsxwriter():
+    """Backend rápido opcional p/ relatórios (streaming, sem grafo de células)."""
+    try:
+        import xlsxwriter
+    except ImportError:
+        return None
+    return xlsxwriter
+
+_PDV_RE = re.compile(r"[^\w\-]+")
+
+
+@functools.lru_cache(maxsize=4096)
+def _sanitize_pdv(v: str) -> str:
+    """PDV seguro para nome de arquivo; memoizado (PDVs distintos são poucos)."""
+    v = (v or "").strip() or "SEM_PDV"
+    return _PDV_RE.sub("_", v)
+
+_BOM_UTF8 = b"\xef\xbb\xbf"  # mesmo prefixo do encoding utf-8-sig
+_CSV_BATCH = 1000
+
+
+def _csv_field(v) -> str:
+    # mesma regra de citação do csv.writer: aspas só quando necessário
+    s = v if type(v) is str else str(v)
+    if '"' in s:
+        return '"' + s.replace('"', '""') + '"'
+    if "," in s or "\n" in s or "\r" in s:
+        return '"' + s + '"'
+    return s
+
+
+def _dump_csv(path: Path, rows: list[dict], fields: tuple[str, ...]) -> None:
+    # escrita manual bufferizada: sem o overhead por linha do módulo csv; a
+    # saída é byte a byte igual (BOM utf-8-sig, vírgula, CRLF, aspas idem)
+    fields = tuple(fields)
+    with open(path, "wb", buffering=1 << 20) as f:
+        f.write(_BOM_UTF8)
+        lines = [(",".join(map(_csv_field, fields)) + "\r\n").encode("utf-8")]
+        for rec in rows:
+            rec_get = rec.get
+            lines.append(
+                (",".join(_csv_field(rec_get(k, "")) for k in fields) + "\r\n")
+                .encode("utf-8")
+            )
+            if len(lines) >= _CSV_BATCH:
+                f.writelines(lines)
+                lines.clear()
+        if lines:
+            f.writelines(lines)
+
+
+def _dump_csvs_parallel(jobs: list[tuple[str, Path, list[dict]]],
+                        fields: tuple[str, ...]) -> None:
+    # escrita de CSV é I/O-bound (o GIL é liberado nos write); threads bastam
+    if len(jobs) > 1:
+        with ThreadPoolExecutor(max_workers=min(8, len(jobs))) as ex:
+            futures = [ex.submit(_dump_csv, path, rows, fields) for _, path, rows in jobs]
+            for fut in as_completed(futures):
+                fut.result()  # propaga erros do worker
+    else:
+        for _, path, rows in jobs:
+            _dump_csv(path, rows, fields)
+
+
+def group_records_by_pdv(records: list[dict]) -> dict[str, list[dict]]:
+    """Agrupa por PDV sanitizado e ordena cada grupo por SKU.
+
+    Feito UMA vez por rodada no pipeline; os writers por PDV recebem o
+    resultado pronto em vez de reagrupar/reordenar cada um por conta própria.
+    """
+    groups: dict[str, list[dict]] = {}
+    for rec in records:
+        groups.setdefault(_sanitize_pdv(rec.get("PDV") or ""), []).append(rec)
+    for rows in groups.values():
+        rows.sort(key=itemgetter("SKU"))
+    return groups
+
+
+def write_consolidated_csv(groups: dict[str, list[dict]], cfg: Config,
+                           date_str: str | None = None) -> Path:
+    if not groups:
         raise ValueError("Nenhum registro válido para salvar.")
-    records = sorted(records, key=lambda r: (r.get("PDV",""), r.get("SKU","")))
-    cfg.output_dir.mkdir(parents=True, exist_ok=True)
-    out = cfg.output_dir / f"{cfg.output_basename}_{yesterday_str(cfg)}.csv"
-    with out.open("w", newline="", encoding="utf-8-sig") as f:
-        w = csv.DictWriter(f, fieldnames=cfg.final_fields)
-        w.writeheader()
-        for rec in records:
-            w.writerow({k: rec.get(k, "") for k in cfg.final_fields})
+    # os grupos do pipeline já vêm ordenados por SKU; concatenar os PDVs em
+    # ordem reproduz o consolidado sem reordenar o dataset inteiro de novo
+    records: list[dict] = []
+    for _, rows in sorted(groups.items(), key=lambda kv: kv[0]):
+        records.extend(rows)
+    # ensure_dirs(cfg) já criou output_dir
+    if date_str is None:
+        date_str = yesterday_str(cfg)
+    out = cfg.output_dir / f"{cfg.output_basename}_{date_str}.csv"
+    _dump_csv(out, records, cfg.final_fields)
     return out
 
-def write_csvs_by_pdv(records: list[dict], cfg: Config) -> dict[str, Path]:
-    if not records:
+def write_csvs_by_pdv(groups: dict[str, list[dict]], cfg: Config,
+                      date_str: str | None = None) -> dict[str, Path]:
+    if not groups:
         return {}
-    date_str = yesterday_str(cfg)
+    if date_str is None:
+        date_str = yesterday_str(cfg)
     folder = cfg.output_dir / f"por_pdv_{date_str}"
-    folder.mkdir(parents=True, exist_ok=True)
+    folder.mkdir(parents=True, exist_ok=True)  # uma vez por rodada, não por PDV
 
-    groups: dict[str, list[dict]] = {}
-    for rec in records:
-        pdv = (rec.get("PDV") or "").strip() or "SEM_PDV"
-        pdv = re.sub(r"[^\w\-]+", "_", pdv)
-        groups.setdefault(pdv, []).append(rec)
-
-    paths: dict[str, Path] = {}
+    jobs: list[tuple[str, Path, list[dict]]] = []
     for pdv, rows in sorted(groups.items(), key=lambda kv: kv[0]):
-        rows_sorted = sorted(rows, key=lambda r: (r.get("SKU","")))
-        path = folder / f"{cfg.output_basename}_{date_str}_PDV_{pdv}.csv"
-        with path.open("w", newline="", encoding="utf-8-sig") as f:
-            w = csv.DictWriter(f, fieldnames=cfg.final_fields)
-            w.writeheader()
-            for rec in rows_sorted:
-                w.writerow({k: rec.get(k, "") for k in cfg.final_fields})
-        paths[pdv] = path
-    return paths
-
-
-def write_reports_xlsx_by_pdv(records: list[dict], cfg: Config) -> dict[str, Path]:
+        jobs.append((pdv, folder / f"{cfg.output_basename}_{date_str}_PDV_{pdv}.csv", rows))
+    _dump_csvs_parallel(jobs, cfg.final_fields)
+    return {pdv: path for pdv, path, _ in jobs}
+
+
+def write_reports_xlsx_by_pdv(groups: dict[str, list[dict]], cfg: Config,
+                              date_str: str | None = None) -> dict[str, Path]:
     """
     Cria um arquivo .xlsx por PDV em:
       data/output/relatorio_finalizado_DD_MM_AAAA/relatorio_finalizado_DD_MM_AAAA_PDV_<pdv>.xlsx
@@ -64,149 +141,269 @@ def write_reports_xlsx_by_pdv(records: list[dict], cfg: Config) -> dict[str, Pat
       - A tabela começa na linha 5
       - Coluna "CURVA": A/B=verde, C=amarelo, D/E=vermelho
     """
-    if not records:
+    if not groups:
         return {}
-    GROUP_NAME = "Grupo Ana Sobral"
-    date_str = yesterday_str(cfg)
+    if date_str is None:
+        date_str = yesterday_str(cfg)
     folder = cfg.output_dir / f"{cfg.report_folder_prefix}_{date_str}"
-    folder.mkdir(parents=True, exist_ok=True)
-
-    # Agrupar por PDV
-    groups: dict[str, list[dict]] = {}
-    for rec in records:
-        pdv_raw = (rec.get("PDV") or "").strip() or "SEM_PDV"
-        pdv = re.sub(r"[^\w\-]+", "_", pdv_raw)
-        groups.setdefault(pdv, []).append(rec)
+    folder.mkdir(parents=True, exist_ok=True)  # uma vez por rodada, não por PDV
 
     header = list(cfg.final_fields)
-    ncols = len(header)
-    last_col_letter = get_column_letter(ncols)
 
     # larguras sugeridas
     widths = {
         "PDV": 12, "SKU": 14, "DESCRIÇÃO": 50, "MARCA": 16, "CURVA": 10, "ESTOQUE_ATUAL": 18
     }
 
-    # Fills para CURVA
-    FILL_GREEN  = PatternFill(fill_type="solid", start_color="C6EFCE", end_color="C6EFCE")  # verde claro
-    FILL_YELLOW = PatternFill(fill_type="solid", start_color="FFEB9C", end_color="FFEB9C")  # amarelo claro
-    FILL_RED    = PatternFill(fill_type="solid", start_color="FFC7CE", end_color="FFC7CE")  # vermelho claro
+    write_one = (
+        _write_report_xlsxwriter if _xlsxwriter() is not None else _write_report_openpyxl
+    )
+
+    jobs: list[tuple[str, Path, list[dict]]] = []
+    for pdv, rows in sorted(groups.items(), key=lambda kv: kv[0]):
+        path = folder / f"{cfg.report_folder_prefix}_{date_str}_PDV_{pdv}.xlsx"
+        jobs.append((pdv, path, rows))
 
     out_paths: dict[str, Path] = {}
+    max_workers = min(len(jobs), os.cpu_count() or 1)
+    if max_workers > 1:
+        # cada PDV é um workbook independente; a serialização XML + deflate é
+        # CPU-bound, então processos escalam (threads ficariam presas no GIL)
+        with ProcessPoolExecutor(max_workers=max_workers) as ex:
+            futures = {
+                ex.submit(write_one, path, rows, header, widths,
+                          cfg.report_sheet_main, cfg.report_sheet_disc): pdv
+                for pdv, path, rows in jobs
+            }
+            for fut in as_completed(futures):
+                fut.result()  # propaga erros do worker
+    else:
+        for pdv, path, rows in jobs:
+            write_one(path, rows, header, widths,
+                      cfg.report_sheet_main, cfg.report_sheet_disc)
+
+    for pdv, path, _ in jobs:
+        out_paths[pdv] = path
+    return out_paths
 
-    for pdv, rows in sorted(groups.items(), key=lambda kv: kv[0]):
-        rows_sorted = sorted(rows, key=lambda r: (r.get("SKU", "")))
 
-        # === Workbook e folha principal ===
-        wb = Workbook()
-        ws = wb.active
-        ws.title = cfg.report_sheet_main
+_GROUP_NAME = "Grupo Ana Sobral"
+_HEADER_ROW = 4  # linhas 1-3: título, espaço p/ logo e respiro
+
+
+def _write_report_xlsxwriter(path: Path, rows: list[dict], header: list[str],
+                             widths: dict[str, int],
+                             sheet_main: str, sheet_disc: str) -> None:
+    """Backend rápido: streaming com constant_memory (nada de grafo de células)."""
+    xlsxwriter = _xlsxwriter()
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    wb = xlsxwriter.Workbook(str(tmp), {"constant_memory": True, "use_zip64": True})
+    fmt_title = wb.add_format(
+        {"bold": True, "font_size": 16, "align": "center", "valign": "vcenter"}
+    )
+    fmt_hdr = wb.add_format({"bold": True, "align": "center", "valign": "vcenter"})
+    fmt_blank = wb.add_format({})
+    fmt_curva = {
+        "A": wb.add_format({"bg_color": "#C6EFCE"}),  # verde claro
+        "C": wb.add_format({"bg_color": "#FFEB9C"}),  # amarelo claro
+        "D": wb.add_format({"bg_color": "#FFC7CE"}),  # vermelho claro
+    }
+    fmt_curva["B"] = fmt_curva["A"]
+    fmt_curva["E"] = fmt_curva["D"]
 
-        # --- Cabeçalho visual (linhas 1-3) ---
+    ncols = len(header)
+    curva_idx = header.index("CURVA") if "CURVA" in header else -1
+
+    def scaffold(ws) -> None:
+        ws.merge_range(0, 0, 0, ncols - 1, _GROUP_NAME, fmt_title)
+        ws.set_row(1, 40)  # espaço para LOGO
+        # em constant_memory uma linha sem células nunca é descarregada e o
+        # set_row acima se perderia; um blank formatado força a linha a sair
+        ws.write_blank(1, 0, None, fmt_blank)
+        for c_idx, col_name in enumerate(header):
+            ws.set_column(c_idx, c_idx, widths.get(col_name, 16))
+        ws.write_row(_HEADER_ROW - 1, 0, header, fmt_hdr)
+        ws.freeze_panes(_HEADER_ROW, 0)
+        ws.autofilter(_HEADER_ROW - 1, 0, _HEADER_ROW - 1, ncols - 1)
+        ws.hide_gridlines(2)  # visual limpo de relatório (tela e impressão)
+
+    ws = wb.add_worksheet(sheet_main)
+    scaffold(ws)
+    # o extrator monta os dicts na ordem exata de cfg.final_fields; quando a
+    # ordem das chaves bate com o cabeçalho, rec.values() dispensa um get
+    # com hash por coluna (basta conferir o primeiro registro)
+    fields = tuple(header)
+    fast_values = bool(rows) and tuple(rows[0]) == fields
+    for r_idx, rec in enumerate(rows, start=_HEADER_ROW):
+        vals = list(rec.values()) if fast_values else \
+            [rec.get(col_name, "") for col_name in header]
+        ws.write_row(r_idx, 0, vals)
+        if curva_idx >= 0:
+            # reescrever a célula da linha corrente é permitido mesmo em
+            # constant_memory (a linha só é descarregada ao avançar de linha)
+            v = vals[curva_idx]
+            fmt = fmt_curva.get(str(v).strip().upper())
+            if fmt is not None:
+                ws.write(r_idx, curva_idx, v, fmt)
+
+    # segunda aba: Descontinuados (mesmo topo visual, sem dados por enquanto)
+    scaffold(wb.add_worksheet(sheet_disc))
+
+    wb.close()
+    os.replace(tmp, path)
+
+
+@functools.cache
+def _openpyxl_styles() -> dict:
+    """Estilos compartilhados do fallback openpyxl, criados uma única vez.
+
+    Instanciá-los por workbook/por PDV multiplicava alocações e o trabalho de
+    dedup de estilos no save; cache (em vez de constantes de módulo) mantém o
+    import do openpyxl adiado para quem só gera CSV.
+    """
+    from openpyxl.styles import Font, Alignment, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    fill_green  = PatternFill(fill_type="solid", start_color="C6EFCE", end_color="C6EFCE")
+    fill_yellow = PatternFill(fill_type="solid", start_color="FFEB9C", end_color="FFEB9C")
+    fill_red    = PatternFill(fill_type="solid", start_color="FFC7CE", end_color="FFC7CE")
+    return {
+        "font_title": Font(bold=True, size=16),
+        "font_hdr": Font(bold=True),
+        "align_center": Alignment(horizontal="center", vertical="center"),
+        "fill_green":  fill_green,
+        "fill_yellow": fill_yellow,
+        "fill_red":    fill_red,
+        # CURVA -> fill, pronto para um único dict.get por linha
+        "curva_fill": {
+            "A": fill_green, "B": fill_green,
+            "C": fill_yellow,
+            "D": fill_red, "E": fill_red,
+        },
+        # A..AE cobre de sobra as 6 colunas do relatório
+        "col_letters": [get_column_letter(i) for i in range(1, 32)],
+    }
+
+
+@functools.lru_cache(maxsize=8)
+def _report_template_bytes(header: tuple[str, ...], widths_items: tuple,
+                           sheet_main: str, sheet_disc: str) -> bytes:
+    """Workbook-modelo (título/logo/cabeçalho/larguras/freeze/filtro) em bytes.
+
+    O andaime é idêntico para todos os PDVs; montá-lo e serializá-lo uma vez
+    e recarregar de BytesIO por PDV evita refazer o mesmo topo P vezes.
+    """
+    from openpyxl import Workbook
+
+    st = _openpyxl_styles()
+    col_letters = st["col_letters"]
+    widths = dict(widths_items)
+
+    ncols = len(header)
+    last_col_letter = col_letters[ncols - 1]
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sheet_main
+
+    def scaffold(ws) -> None:
         # Título
         ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=ncols)
-        cell_title = ws.cell(row=1, column=1, value=GROUP_NAME)
-        cell_title.font = Font(bold=True, size=16)
-        cell_title.alignment = Alignment(horizontal="center", vertical="center")
+        cell_title = ws.cell(row=1, column=1, value=_GROUP_NAME)
+        cell_title.font = st["font_title"]
+        cell_title.alignment = st["align_center"]
 
         # Espaço para LOGO (só reservando altura por enquanto)
         ws.row_dimensions[2].height = 40  # facilita inserir logo futuramente
         # Linha 3 deixamos vazia (respiro)
 
         # --- Cabeçalho da tabela na linha 4 ---
-        header_row = 4
         for col_idx, col_name in enumerate(header, start=1):
-            c = ws.cell(row=header_row, column=col_idx, value=col_name)
-            c.font = Font(bold=True)
-            c.alignment = Alignment(horizontal="center", vertical="center")
-            ws.column_dimensions[get_column_letter(col_idx)].width = widths.get(col_name, 16)
-
-        ws.freeze_panes = f"A{header_row+1}"  # congela até o cabeçalho
-        ws.auto_filter.ref = f"A{header_row}:{last_col_letter}{header_row}"
-
-        # --- Dados: começam na linha 5 ---
-        first_data_row = header_row + 1
-        for r_idx, rec in enumerate(rows_sorted, start=first_data_row):
-            for c_idx, col_name in enumerate(header, start=1):
-                ws.cell(row=r_idx, column=c_idx, value=rec.get(col_name, ""))
-
-        # --- Coloração condicional (CURVA) ---
-        if "CURVA" in header:
-            curva_col_idx = header.index("CURVA") + 1
-            for r in range(first_data_row, ws.max_row + 1):
-                val = ws.cell(row=r, column=curva_col_idx).value
-                if val is None:
-                    continue
-                v = str(val).strip().upper()
-                if v in {"A", "B"}:
-                    ws.cell(row=r, column=curva_col_idx).fill = FILL_GREEN
-                elif v == "C":
-                    ws.cell(row=r, column=curva_col_idx).fill = FILL_YELLOW
-                elif v in {"D", "E"}:
-                    ws.cell(row=r, column=curva_col_idx).fill = FILL_RED
-
-        # === Segunda aba: Descontinuados (com o mesmo topo visual e cabeçalho vazio por enquanto) ===
-        ws2 = wb.create_sheet(cfg.report_sheet_disc)
-
-        # topo visual
-        ws2.merge_cells(start_row=1, start_column=1, end_row=1, end_column=ncols)
-        cell_title2 = ws2.cell(row=1, column=1, value=GROUP_NAME)
-        cell_title2.font = Font(bold=True, size=16)
-        cell_title2.alignment = Alignment(horizontal="center", vertical="center")
-        ws2.row_dimensions[2].height = 40
-
-        # cabeçalho da tabela
-        for col_idx, col_name in enumerate(header, start=1):
-            c = ws2.cell(row=header_row, column=col_idx, value=col_name)
-            c.font = Font(bold=True)
-            c.alignment = Alignment(horizontal="center", vertical="center")
-            ws2.column_dimensions[get_column_letter(col_idx)].width = widths.get(col_name, 16)
-
-        ws2.freeze_panes = f"A{header_row+1}"
-        ws2.auto_filter.ref = f"A{header_row}:{last_col_letter}{header_row}"
-
-        # --- Salvar de forma atômica ---
-        path = folder / f"{cfg.report_folder_prefix}_{date_str}_PDV_{pdv}.xlsx"
-        tmp  = path.with_suffix(path.suffix + ".tmp")
-        wb.save(tmp)
-        os.replace(tmp, path)
-        out_paths[pdv] = path
-
-    return out_paths
+            c = ws.cell(row=_HEADER_ROW, column=col_idx, value=col_name)
+            c.font = st["font_hdr"]
+            c.alignment = st["align_center"]
+            ws.column_dimensions[col_letters[col_idx - 1]].width = widths.get(col_name, 16)
+
+        ws.freeze_panes = f"A{_HEADER_ROW+1}"  # congela até o cabeçalho
+        ws.auto_filter.ref = f"A{_HEADER_ROW}:{last_col_letter}{_HEADER_ROW}"
+        ws.sheet_view.showGridLines = False  # visual limpo de relatório
+
+    scaffold(ws)
+    # segunda aba: Descontinuados (mesmo topo visual, sem dados por enquanto)
+    scaffold(wb.create_sheet(sheet_disc))
+
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _write_report_openpyxl(path: Path, rows: list[dict], header: list[str],
+                           widths: dict[str, int],
+                           sheet_main: str, sheet_disc: str) -> None:
+    """Backend de contingência quando xlsxwriter não está instalado."""
+    from openpyxl import load_workbook
+
+    st = _openpyxl_styles()
+    curva_fill = st["curva_fill"]  # CURVA -> PatternFill (verde/amarelo/vermelho)
+
+    # === Workbook a partir do modelo (andaime pronto, só falta os dados) ===
+    template = _report_template_bytes(
+        tuple(header), tuple(sorted(widths.items())), sheet_main, sheet_disc
+    )
+    wb = load_workbook(io.BytesIO(template))
+    ws = wb[sheet_main]
+
+    curva_col_idx = header.index("CURVA") + 1 if "CURVA" in header else 0
+
+    # --- Dados: começam na linha 5 ---
+    # ws.append entra pelo caminho interno em lote (sem parse de coordenada
+    # por célula como em ws.cell); basta posicionar o cursor após o cabeçalho.
+    # A cor de CURVA é decidida aqui mesmo (sem segunda passada relendo células)
+    first_data_row = _HEADER_ROW + 1
+    ws._current_row = _HEADER_ROW
+    for r_idx, rec in enumerate(rows, start=first_data_row):
+        ws.append([rec.get(col_name, "") for col_name in header])
+        if curva_col_idx:
+            fill = curva_fill.get(str(rec.get("CURVA", "")).strip().upper())
+            if fill is not None:
+                ws.cell(row=r_idx, column=curva_col_idx).fill = fill
+
+    # --- Salvar de forma atômica: monta o zip em memória e grava com um único
+    # write + fsync antes do replace (sem o buffering em disco do openpyxl).
+    # Deflate nível 1 em vez do 6 padrão: o zip é boa parte do tempo do save e
+    # esses relatórios são pequenos demais para a diferença de tamanho importar
+    from openpyxl.writer.excel import ExcelWriter
+    from zipfile import ZipFile, ZIP_DEFLATED
+
+    buf = io.BytesIO()
+    ExcelWriter(wb, ZipFile(buf, "w", ZIP_DEFLATED,
+                            allowZip64=True, compresslevel=1)).save()
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb", buffering=0) as f:
+        f.write(buf.getbuffer())
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
 
 #DESCONTINUADOS 
 
-def write_discontinued_csvs_by_pdv(records: list[dict], cfg: Config) -> dict[str, Path]:
+def write_discontinued_csvs_by_pdv(groups: dict[str, list[dict]], cfg: Config,
+                                   date_str: str | None = None) -> dict[str, Path]:
     """
     Gera CSVs de DESCONTINUADOS por PDV em:
       data/output/descontinuados_DD_MM_AAAA/descontinuados_DD_MM_AAAA_PDV_<pdv>.csv
 
     Campos (ordem exata): cfg.discontinued_fields
     """
-    if not records:
+    if not groups:
         return {}
 
-    
-    date_str = yesterday_str(cfg)
+    if date_str is None:
+        date_str = yesterday_str(cfg)
     folder = cfg.output_dir / f"{cfg.discontinued_folder_prefix}_{date_str}"
-    folder.mkdir(parents=True, exist_ok=True)
-
-    # agrupar por PDV
-    groups: dict[str, list[dict]] = {}
-    for rec in records:
-        pdv = (rec.get("PDV") or "").strip() or "SEM_PDV"
-        pdv = re.sub(r"[^\w\-]+", "_", pdv)
-        groups.setdefault(pdv, []).append(rec)
+    folder.mkdir(parents=True, exist_ok=True)  # uma vez por rodada, não por PDV
 
-    paths: dict[str, Path] = {}
+    jobs: list[tuple[str, Path, list[dict]]] = []
     for pdv, rows in sorted(groups.items(), key=lambda kv: kv[0]):
-        rows_sorted = sorted(rows, key=lambda r: (r.get("SKU", "")))
-        path = folder / f"{cfg.discontinued_folder_prefix}_{date_str}_PDV_{pdv}.csv"
-        with path.open("w", newline="", encoding="utf-8-sig") as f:
-            w = csv.DictWriter(f, fieldnames=cfg.discontinued_fields)
-            w.writeheader()
-            for rec in rows_sorted:
-                w.writerow({k: rec.get(k, "") for k in cfg.discontinued_fields})
-        paths[pdv] = path
-
-    return paths
+        jobs.append((pdv, folder / f"{cfg.discontinued_folder_prefix}_{date_str}_PDV_{pdv}.csv", rows))
+    _dump_csvs_parallel(jobs, cfg.discontinued_fields)
+    return {pdv: path for pdv, path, _ in jobs}
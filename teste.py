@@ -1,12 +1,12 @@
 from __future__ import annotations
 
-import re
+import functools
+import sys
 from pathlib import Path
 import logging
 from typing import Optional, Iterable
 from zoneinfo import ZoneInfo
 from datetime import datetime, timedelta
-import csv
 import shutil
 
 # ---------- Config ----------
@@ -16,6 +16,15 @@ INPUT_DIR    = DATA_DIR / "input"
 OUTPUT_DIR   = DATA_DIR / "output"
 ARCHIVE_DIR  = DATA_DIR / "archived"
 
+# layout src/: permite rodar o script direto, sem instalar o pacote
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+from estoque_sem_giro.config import load_config, yesterday_str
+from estoque_sem_giro.writers import (
+    group_records_by_pdv,
+    write_consolidated_csv,
+    write_csvs_by_pdv,
+)
+
 EXPECTED_SHEETS: tuple[str, ...] = ("EUD", "BOT", "QDB")
 PREVIEW_COLS: tuple[str, ...]    = ("A", "C", "E", "I", "J")  # A=SKU, C=DESCRIÇÃO, E=CURVA/CLASSE, I=PDV, J=ESTOQUE_ATUAL
 TZ = ZoneInfo("America/Recife")  # use "America/Maceio" se preferir
@@ -79,49 +88,23 @@ def _looks_like_header(values: list[str]) -> bool:
             hits += 1
     return hits >= 2  # pelo menos 2 termos de cabeçalho
 
-def find_header_row(ws, cols=("A","C","E","I","J"), search_limit=200) -> int | None:
-    """
-    Localiza a linha de cabeçalho analisando SOMENTE as colunas-alvo,
-    usando leitura streaming (iter_rows) — muito mais rápido em read_only.
-    """
-    from openpyxl.utils.cell import column_index_from_string
-
-    # letras -> índices (A=1, C=3, E=5, I=9, J=10)
-    idxs = [column_index_from_string(c) for c in cols]
-    max_col = max(idxs)
-    max_row_scan = min(ws.max_row or 1, search_limit)
-
-    for r_idx, row in enumerate(
-        ws.iter_rows(min_row=1, max_row=max_row_scan, min_col=1, max_col=max_col, values_only=True),
-        start=1
-    ):
-        values = []
-        for i in idxs:
-            v = row[i-1] if len(row) >= i else None
-            values.append(_clean_str(v))
-        if _looks_like_header(values):
-            return r_idx
-    return None
-
-
 # ---------- Preview visual (opcional) ----------
 def _format_row(values: list[str]) -> str:
     widths = [max(12, min(40, max(len(v), 4))) for v in values]
     return " | ".join(v.ljust(w)[:w] for v, w in zip(values, widths))
 
-def preview_sheet(ws, sheet_name: str, cols: Iterable[str] = PREVIEW_COLS, max_rows: int = 5) -> None:
+def preview_sheet(wb, sheet_name: str, cols: Iterable[str] = PREVIEW_COLS, max_rows: int = 5) -> None:
     from openpyxl.utils.cell import column_index_from_string
     logging.info("Prévia da aba: %s (colunas: %s)", sheet_name, ", ".join(cols))
     header = [f"{c}" for c in cols]
     logging.info(_format_row(header))
+    idxs = [column_index_from_string(c) for c in cols]
     printed = 0
-    for row_idx in range(1, ws.max_row + 1):
+    for row in iter_sheet_values(wb, sheet_name):
         row_vals: list[str] = []
         has_any = False
-        for c in cols:
-            col_idx = column_index_from_string(c)
-            cell = ws.cell(row=row_idx, column=col_idx)
-            val = _clean_str(cell.value)
+        for i in idxs:
+            val = _clean_str(row[i-1] if len(row) >= i else None)
             if val:
                 has_any = True
             row_vals.append(val)
@@ -134,10 +117,38 @@ def preview_sheet(ws, sheet_name: str, cols: Iterable[str] = PREVIEW_COLS, max_r
         logging.info("(sem conteúdo visível nessas colunas)")
 
 # ---------- Abertura workbook ----------
+@functools.cache
+def _calamine():
+    """Leitor nativo opcional (Rust); bem mais rápido que openpyxl read_only."""
+    try:
+        from python_calamine import CalamineWorkbook
+    except ImportError:
+        return None
+    return CalamineWorkbook
+
+
 def open_workbook(xlsx_path: Path):
+    CalamineWorkbook = _calamine()
+    if CalamineWorkbook is not None:
+        return CalamineWorkbook.from_path(str(xlsx_path))
     from openpyxl import load_workbook
     return load_workbook(filename=str(xlsx_path), read_only=True, data_only=True)
 
+
+def sheet_names(wb) -> list[str]:
+    # openpyxl expõe .sheetnames; calamine, .sheet_names
+    return list(getattr(wb, "sheetnames", None) or wb.sheet_names)
+
+
+def iter_sheet_values(wb, sheet_name: str):
+    """Itera as linhas da aba como listas/tuplas de valores já tipados."""
+    if hasattr(wb, "sheetnames"):  # openpyxl (read_only)
+        yield from wb[sheet_name].iter_rows(values_only=True)
+    else:  # calamine
+        # skip_empty_area=False: aparar linhas/colunas vazias do início
+        # deslocaria as posições fixas A/C/E/I/J do extrator
+        yield from wb.get_sheet_by_name(sheet_name).to_python(skip_empty_area=False)
+
 # ---------- Extração normalizada ----------
 _COL_MAP = {
     "A": "SKU",
@@ -147,23 +158,20 @@ _COL_MAP = {
     "J": "ESTOQUE_ATUAL",
 }
 
-def extract_records_from_sheet(ws, marca: str) -> list[dict]:
+def extract_records_from_sheet(rows, marca: str, search_limit: int = 200) -> list[dict]:
     """
     Extrai colunas A,C,E,I,J como:
     { PDV, SKU, DESCRIÇÃO, MARCA, CURVA, ESTOQUE_ATUAL }
-    Lê com iter_rows(values_only=True) para performance,
-    começa logo abaixo do cabeçalho e pula linhas sem PDV/SKU.
+    Recebe qualquer iterável de linhas (calamine ou openpyxl values_only);
+    o cabeçalho é detectado na mesma varredura (as linhas de lixo acima
+    dele são descartadas) e linhas sem PDV/SKU são puladas.
     """
     # mapeamento fixo de posições (A=1, C=3, E=5, I=9, J=10)
     col_pos = {"A": 1, "C": 3, "E": 5, "I": 9, "J": 10}
 
-    # achar cabeçalho com a função otimizada
-    header_row = find_header_row(ws, cols=("A","C","E","I","J"))
-    start_row = (header_row + 1) if header_row else 1
-    max_col = max(col_pos.values())
-
     records: list[dict] = []
-    for row in ws.iter_rows(min_row=start_row, min_col=1, max_col=max_col, values_only=True):
+    searching_header = True
+    for r_idx, row in enumerate(rows, start=1):
         # pegar valores com segurança — se a linha tiver menos colunas, tratamos como vazio
         def at(i: int) -> str:
             return _clean_str(row[i-1] if len(row) >= i else "")
@@ -174,6 +182,16 @@ def extract_records_from_sheet(ws, marca: str) -> list[dict]:
         pdv  = at(col_pos["I"])
         est  = at(col_pos["J"])
 
+        if searching_header:
+            if _looks_like_header([sku, desc, curva, pdv, est]):
+                # achou o cabeçalho: linhas anteriores eram lixo de topo
+                searching_header = False
+                records.clear()
+                continue
+            if r_idx >= search_limit:
+                # sem cabeçalho nas primeiras linhas: trata tudo como dados
+                searching_header = False
+
         # pular totalmente vazias
         if not any((sku, desc, curva, pdv, est)):
             continue
@@ -195,10 +213,10 @@ def extract_records_from_sheet(ws, marca: str) -> list[dict]:
 
 def extract_all(wb) -> list[dict]:
     data: list[dict] = []
+    names = sheet_names(wb)
     for sheet in EXPECTED_SHEETS:
-        if sheet in wb.sheetnames:
-            ws = wb[sheet]
-            recs = extract_records_from_sheet(ws, marca=sheet)
+        if sheet in names:
+            recs = extract_records_from_sheet(iter_sheet_values(wb, sheet), marca=sheet)
             logging.info("[Resumo] %s -> %d registros", sheet, len(recs))
             data.extend(recs)
         else:
@@ -206,77 +224,8 @@ def extract_all(wb) -> list[dict]:
     return data
 
 # ---------- Escrita CSV ----------
-def write_consolidated_csv(records: list[dict], output_dir: Path, base_name: str = OUTPUT_BASENAME) -> Path:
-    if not records:
-        raise ValueError("Nenhum registro válido para salvar.")
-
-    # Agrupa por PDV e organiza por SKU dentro do PDV
-    try:
-        records = sorted(records, key=lambda r: (r.get("PDV", ""), r.get("SKU", "")))
-    except Exception:
-        pass
-
-    output_dir.mkdir(parents=True, exist_ok=True)
-    fname = f"{base_name}_{yesterday_str_recife()}.csv"
-    out_path = output_dir / fname
-
-    with out_path.open("w", newline="", encoding="utf-8-sig") as f:
-        writer = csv.DictWriter(f, fieldnames=FINAL_FIELDS)
-        writer.writeheader()
-        for rec in records:
-            writer.writerow({
-                "PDV":           rec.get("PDV", ""),
-                "SKU":           rec.get("SKU", ""),
-                "DESCRIÇÃO":     rec.get("DESCRIÇÃO", ""),
-                "MARCA":         rec.get("MARCA", ""),
-                "CURVA":         rec.get("CURVA", ""),
-                "ESTOQUE_ATUAL": rec.get("ESTOQUE_ATUAL", ""),
-            })
-
-    logging.info("[OK] CSV consolidado salvo (agrupado por PDV): %s (linhas=%d)", out_path, len(records))
-    return out_path
-
-def write_csvs_by_pdv(records: list[dict], output_dir: Path, base_name: str = OUTPUT_BASENAME) -> dict[str, Path]:
-    """
-    Gera 1 CSV por PDV dentro de data/output/por_pdv_DD_MM_AAAA.
-    Retorna {pdv: Path}.
-    """
-    if not records:
-        return {}
-
-    # Agrupa por PDV e ordena por SKU dentro do PDV
-    groups: dict[str, list[dict]] = {}
-    for rec in records:
-        pdv = str(rec.get("PDV", "")).strip() or "SEM_PDV"
-        # sanitiza para nome de arquivo
-        pdv = re.sub(r"[^\w\-]+", "_", pdv)
-        groups.setdefault(pdv, []).append(rec)
-
-    date_str = yesterday_str_recife()
-    folder = output_dir / f"por_pdv_{date_str}"
-    folder.mkdir(parents=True, exist_ok=True)
-
-    paths: dict[str, Path] = {}
-    for pdv, rows in sorted(groups.items(), key=lambda kv: kv[0]):
-        rows_sorted = sorted(rows, key=lambda r: (r.get("SKU", "")))
-        path = folder / f"{base_name}_{date_str}_PDV_{pdv}.csv"
-        with path.open("w", newline="", encoding="utf-8-sig") as f:
-            writer = csv.DictWriter(f, fieldnames=FINAL_FIELDS)
-            writer.writeheader()
-            for r in rows_sorted:
-                writer.writerow({
-                    "PDV":           r.get("PDV", ""),
-                    "SKU":           r.get("SKU", ""),
-                    "DESCRIÇÃO":     r.get("DESCRIÇÃO", ""),
-                    "MARCA":         r.get("MARCA", ""),
-                    "CURVA":         r.get("CURVA", ""),
-                    "ESTOQUE_ATUAL": r.get("ESTOQUE_ATUAL", ""),
-                })
-        paths[pdv] = path
-
-    logging.info("[OK] %d arquivos por PDV salvos em: %s", len(paths), folder)
-    return paths
-
+# os writers vivem no pacote (estoque_sem_giro.writers); manter uma segunda
+# cópia aqui obrigava a aplicar cada otimização duas vezes
 
 # ---------- Arquivar XLSX ----------
 def archive_xlsx(xlsx: Path) -> Path:
@@ -289,18 +238,16 @@ def archive_xlsx(xlsx: Path) -> Path:
 
 # ---------- Debug auxiliar ----------
 def debug_sheet(ws, max_cols=40, max_rows=5):
+    # iter_rows(values_only=True) em vez de ws.cell(r, c): acesso aleatório em
+    # read_only reparseia o XML da aba a cada célula consultada
     from openpyxl.utils import get_column_letter
     print(f"\n=== Debug: {ws.title} ===")
     print("dimension:", ws.calculate_dimension(), "| max_row:", ws.max_row, "| max_col:", ws.max_column)
-    for r in range(1, min(ws.max_row, max_rows) + 1):
-        row_vals = []
-        has_any = False
-        for c in range(1, min(ws.max_column, max_cols) + 1):
-            v = ws.cell(row=r, column=c).value
-            row_vals.append("" if v is None else str(v))
-            if v not in (None, ""):
-                has_any = True
-        if has_any:
+    for row in ws.iter_rows(min_row=1, max_row=min(ws.max_row, max_rows),
+                            min_col=1, max_col=min(ws.max_column, max_cols),
+                            values_only=True):
+        row_vals = ["" if v is None else str(v) for v in row]
+        if any(row_vals):
             cols = [get_column_letter(i) for i in range(1, len(row_vals)+1)]
             print(" ".join(cols))
             print(" | ".join(x if x != "" else "." for x in row_vals))
@@ -326,12 +273,13 @@ def main() -> int:
         logging.exception("Falha ao abrir o arquivo com openpyxl: %s", e)
         return 3
 
-    logging.info("Abas disponíveis: %s", ", ".join(wb.sheetnames))
+    names = sheet_names(wb)
+    logging.info("Abas disponíveis: %s", ", ".join(names))
 
     # Prévia curta (pode comentar se preferir)
     for sheet in EXPECTED_SHEETS:
-        if sheet in wb.sheetnames:
-            preview_sheet(wb[sheet], sheet_name=sheet, cols=PREVIEW_COLS, max_rows=3)
+        if sheet in names:
+            preview_sheet(wb, sheet_name=sheet, cols=PREVIEW_COLS, max_rows=3)
 
     # Extrair
     records = extract_all(wb)
@@ -362,10 +310,18 @@ def main() -> int:
         )
         return 4
 
-    out_path = write_consolidated_csv(records, OUTPUT_DIR, base_name=OUTPUT_BASENAME)
+    # escrita via writers do pacote: agrupa/ordena por PDV uma única vez
+    # (cada writer cria a própria pasta datada; nada de pastas vazias aqui)
+    cfg = load_config()
+    date_str = yesterday_str(cfg)
+    groups = group_records_by_pdv(records)
+
+    out_path = write_consolidated_csv(groups, cfg, date_str)
+    logging.info("[OK] CSV consolidado salvo (agrupado por PDV): %s (linhas=%d)", out_path, len(records))
 
-# Gera CSVs por PDV 
-    write_csvs_by_pdv(records, OUTPUT_DIR, base_name=OUTPUT_BASENAME)
+    # Gera CSVs por PDV
+    paths = write_csvs_by_pdv(groups, cfg, date_str)
+    logging.info("[OK] %d arquivos por PDV salvos.", len(paths))
 
     # Arquiva o arquivo original
     try: